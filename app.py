@@ -4,6 +4,9 @@ from pymongo import MongoClient
 import pandas as pd
 import plotly.graph_objects as go
 import time
+import threading
+import logging
+from collections import OrderedDict
 
 
 # PAGE CONFIG
@@ -20,6 +23,26 @@ st.set_page_config(
 
 MONGO_URI = st.secrets["mongo"]["uri"]
 
+logger = logging.getLogger(__name__)
+
+# Sumber data RAW: "raw" (dht22_logs), "timeseries" (dht22_logs_ts),
+# atau "dual" (baca dht22_logs, bandingkan dengan dht22_logs_ts saat cutover).
+# "timeseries" hanya boleh dipakai kalau data baru juga masuk ke dht22_logs_ts
+# (ingestion menulis ke sana, atau `migrate_timeseries.py migrate --follow` jalan).
+# Beda tampilan di mode "timeseries":
+# - Data Table punya kolom tambahan `device` (metaField, diisi saat migrasi)
+# - created_at selalu datetime UTC (tanpa timezone), bukan string seperti
+#   yang mungkin tersimpan di dht22_logs, jadi format "Last Update" berubah
+RAW_READ_MODES = {"raw", "dual", "timeseries"}
+RAW_READ_MODE = st.secrets["mongo"].get("read_mode", "raw")
+if RAW_READ_MODE not in RAW_READ_MODES:
+    logger.warning("read_mode tidak dikenal: %r, memakai 'raw'", RAW_READ_MODE)
+    st.error(
+        f"Konfigurasi read_mode '{RAW_READ_MODE}' tidak valid "
+        f"(pilihan: raw, dual, timeseries). Membaca dari dht22_logs."
+    )
+    RAW_READ_MODE = "raw"
+
 @st.cache_resource
 def init_connection():
     """
@@ -38,6 +61,8 @@ client = init_connection()
 if client:
     db = client["iot_db"]
     raw_col = db["dht22_logs"]
+    ts_col = db["dht22_logs_ts"]
+    migration_col = db["migrations"]
     clean_col = db["dht22_clean"]
 else:
     st.stop()
@@ -180,10 +205,69 @@ with st.sidebar:
 # HELPERS (DATA FETCHING)
 
 
+def reading_key(doc):
+    """Ringkasan 1 dokumen RAW untuk dibandingkan antar collection"""
+    created_at = pd.to_datetime(doc.get("created_at"), errors="coerce", utc=True)
+    return (created_at, doc.get("temperature"), doc.get("humidity"))
+
+def compare_reads(raw_docs, limit):
+    """
+    Mode dual: bandingkan dokumen RAW yang sudah dimigrasi (_id <= checkpoint
+    migrate_timeseries.py) dengan salinannya di time-series. Data yang belum
+    dimigrasi dilewati agar lag migrasi tidak dianggap beda.
+    Error di sisi time-series tidak boleh mengganggu dashboard.
+    """
+    try:
+        state = migration_col.find_one({"_id": "dht22_logs_to_timeseries"})
+        if not state or state.get("order") != "_id":
+            return
+
+        # Dokumen dengan created_at invalid memang tidak ikut dimigrasi
+        expected = {
+            d["_id"]: reading_key(d) for d in raw_docs
+            if d["_id"] <= state["last_id"] and not pd.isna(reading_key(d)[0])
+        }
+        if not expected:
+            return
+
+        times = [key[0] for key in expected.values()]
+        ts_docs = list(ts_col.find({
+            "created_at": {
+                "$gte": min(times).to_pydatetime(),
+                "$lte": max(times).to_pydatetime()
+            },
+            "_id": {"$in": list(expected)}
+        }))
+        actual = {d["_id"]: reading_key(d) for d in ts_docs}
+
+        missing = len(expected.keys() - actual.keys())
+        differ = sum(
+            1 for _id, key in actual.items()
+            if _id in expected and key != expected[_id]
+        )
+        duplicate = len(ts_docs) - len(actual)
+        if missing or differ or duplicate:
+            logger.warning(
+                "Dual-read mismatch (limit=%s, %s dokumen dibandingkan): "
+                "%s hilang, %s beda, %s dobel di time-series",
+                limit, len(expected), missing, differ, duplicate
+            )
+    except Exception as e:
+        logger.warning("Dual-read time-series gagal: %s", e)
+
+def find_raw(limit):
+    """Mengambil N dokumen RAW terbaru sesuai RAW_READ_MODE"""
+    if RAW_READ_MODE == "timeseries":
+        return list(ts_col.find().sort("created_at", -1).limit(limit))
+    d = list(raw_col.find().sort("created_at", -1).limit(limit))
+    if RAW_READ_MODE == "dual":
+        compare_reads(d, limit)
+    return d
+
 def get_latest():
     """Mengambil 1 data paling baru dari RAW"""
     try:
-        d = list(raw_col.find().sort("created_at", -1).limit(1))
+        d = find_raw(1)
         return d[0] if d else None
     except Exception:
         return None
@@ -191,7 +275,7 @@ def get_latest():
 def get_realtime(limit=100):
     """Mengambil N data terakhir untuk grafik"""
     try:
-        d = list(raw_col.find().sort("created_at", -1).limit(limit))
+        d = find_raw(limit)
         if not d:
             return pd.DataFrame()
         df = pd.DataFrame(d)
@@ -239,7 +323,7 @@ def get_rule_based_clean(rt_temp, rt_hum, temp_tolerance=1.0):
 def get_raw_data(limit=500):
     """Mengambil data RAW untuk tabel"""
     try:
-        d = list(raw_col.find().sort("created_at", -1).limit(limit))
+        d = find_raw(limit)
         if not d:
             return pd.DataFrame()
         df = pd.DataFrame(d)
@@ -302,6 +386,45 @@ def get_clean_data_near_realtime(rt_temp, tolerance=1.0, limit=200):
         return pd.DataFrame()
 
 
+# FIGURE CACHE
+
+FIGURE_CACHE_MAX_ENTRIES = 32
+
+@st.cache_resource
+def init_figure_cache():
+    """
+    Menyimpan figure Plotly yang sudah dibangun, dibagi antar sesi.
+    Key = (nama chart, versi data), jadi figure hanya dibangun ulang
+    kalau datanya berubah. Entry paling lama dibuang (LRU).
+    """
+    return {"figures": OrderedDict(), "lock": threading.Lock()}
+
+def data_version(df, time_col, *params):
+    """Versi data: jumlah baris, timestamp pertama & terakhir, plus parameter query"""
+    if df.empty or time_col not in df.columns:
+        return (0, None, None) + params
+    return (len(df), df[time_col].iloc[0], df[time_col].iloc[-1]) + params
+
+def get_cached_figure(name, version, build):
+    """Ambil figure dari cache, atau bangun dengan build() kalau versinya belum ada"""
+    cache = init_figure_cache()
+    key = (name, version)
+    with cache["lock"]:
+        fig = cache["figures"].get(key)
+        if fig is not None:
+            cache["figures"].move_to_end(key)
+            return fig
+
+    fig = build()
+
+    with cache["lock"]:
+        cache["figures"][key] = fig
+        cache["figures"].move_to_end(key)
+        while len(cache["figures"]) > FIGURE_CACHE_MAX_ENTRIES:
+            cache["figures"].popitem(last=False)
+    return fig
+
+
 
 
 
@@ -477,27 +600,32 @@ elif st.session_state.page == "realtime":
 
     # Chart
     if not df.empty:
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=df["created_at"], y=df["temperature"], 
-            mode='lines', name="Temperature",
-            line=dict(color="#f43f5e", width=3)
-        ))
-        fig.add_trace(go.Scatter(
-            x=df["created_at"], y=df["humidity"], 
-            yaxis="y2", mode='lines', name="Humidity",
-            line=dict(color="#3b82f6", width=3)
-        ))
-        
-        fig.update_layout(
-            template="plotly_dark",
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            yaxis2=dict(overlaying="y", side="right", showgrid=False),
-            hovermode="x unified",
-            height=450,
-            legend=dict(orientation="h", y=1.1)
-        )
+        def build_realtime_chart():
+            fig = go.Figure()
+            fig.add_trace(go.Scatter(
+                x=df["created_at"], y=df["temperature"], 
+                mode='lines', name="Temperature",
+                line=dict(color="#f43f5e", width=3)
+            ))
+            fig.add_trace(go.Scatter(
+                x=df["created_at"], y=df["humidity"], 
+                yaxis="y2", mode='lines', name="Humidity",
+                line=dict(color="#3b82f6", width=3)
+            ))
+            
+            fig.update_layout(
+                template="plotly_dark",
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                yaxis2=dict(overlaying="y", side="right", showgrid=False),
+                hovermode="x unified",
+                height=450,
+                legend=dict(orientation="h", y=1.1)
+            )
+            return fig
+
+        version = data_version(df, "created_at")
+        fig = get_cached_figure("realtime", version, build_realtime_chart)
         st.plotly_chart(fig, use_container_width=True)
 
 # 3. ANALISIS KONDISI
@@ -591,88 +719,100 @@ elif st.session_state.page == "viz":
 
 
 
+    version = data_version(df, "window_start", rt_temp)
+
   
     # LINE CHART AVG TEMP & HUM
   
-    fig_line = go.Figure()
-
-    fig_line.add_trace(go.Scatter(
-        x=df["window_start"],
-        y=df["avg_temperature"],
-        mode="lines",
-        name="Avg Temperature (°C)",
-        line=dict(color="#ef4444", width=3)
-    ))
-
-    fig_line.add_trace(go.Scatter(
-        x=df["window_start"],
-        y=df["avg_humidity"],
-        mode="lines",
-        name="Avg Humidity (%)",
-        yaxis="y2",
-        line=dict(color="#3b82f6", width=3)
-    ))
-
-    fig_line.update_layout(
-        template="plotly_dark",
-        height=420,
-        hovermode="x unified",
-        yaxis2=dict(overlaying="y", side="right"),
-        legend=dict(orientation="h", y=1.1)
-    )
+    def build_line_chart():
+        fig_line = go.Figure()
+
+        fig_line.add_trace(go.Scatter(
+            x=df["window_start"],
+            y=df["avg_temperature"],
+            mode="lines",
+            name="Avg Temperature (°C)",
+            line=dict(color="#ef4444", width=3)
+        ))
+
+        fig_line.add_trace(go.Scatter(
+            x=df["window_start"],
+            y=df["avg_humidity"],
+            mode="lines",
+            name="Avg Humidity (%)",
+            yaxis="y2",
+            line=dict(color="#3b82f6", width=3)
+        ))
+
+        fig_line.update_layout(
+            template="plotly_dark",
+            height=420,
+            hovermode="x unified",
+            yaxis2=dict(overlaying="y", side="right"),
+            legend=dict(orientation="h", y=1.1)
+        )
 
+        # Garis suhu realtime harus ditambahkan sebelum render (figure di-cache)
+        fig_line.add_hline(
+            y=rt_temp,
+            line_dash="dash",
+            line_color="white",
+            annotation_text="Realtime Temp",
+            annotation_position="top left"
+        )
+        return fig_line
+
+    fig_line = get_cached_figure("viz_line", version, build_line_chart)
     st.plotly_chart(fig_line, use_container_width=True)
 
 
     # SCATTER TEMP vs HUM
   
-    fig_scatter = go.Figure()
-
-    fig_scatter.add_trace(go.Scatter(
-        x=df["avg_temperature"],
-        y=df["avg_humidity"],
-        mode="markers",
-        marker=dict(size=8, color=df["avg_temperature"], colorscale="Turbo"),
-        name="Temp vs Hum"
-    ))
-
-    fig_scatter.update_layout(
-        template="plotly_dark",
-        title="Hubungan Suhu dan Kelembapan",
-        xaxis_title="Rata-rata Suhu (°C)",
-        yaxis_title="Rata-rata Kelembapan (%)",
-        height=400
-    )
+    def build_scatter_chart():
+        fig_scatter = go.Figure()
+
+        fig_scatter.add_trace(go.Scatter(
+            x=df["avg_temperature"],
+            y=df["avg_humidity"],
+            mode="markers",
+            marker=dict(size=8, color=df["avg_temperature"], colorscale="Turbo"),
+            name="Temp vs Hum"
+        ))
+
+        fig_scatter.update_layout(
+            template="plotly_dark",
+            title="Hubungan Suhu dan Kelembapan",
+            xaxis_title="Rata-rata Suhu (°C)",
+            yaxis_title="Rata-rata Kelembapan (%)",
+            height=400
+        )
+        return fig_scatter
 
+    fig_scatter = get_cached_figure("viz_scatter", version, build_scatter_chart)
     st.plotly_chart(fig_scatter, use_container_width=True)
 
   
     # HEATMAP KORELASI
    
-    corr = df[["avg_temperature", "avg_humidity"]].corr()
-
-    fig_corr = go.Figure(
-        data=go.Heatmap(
-            z=corr.values,
-            x=corr.columns,
-            y=corr.columns,
-            colorscale="RdBu",
-            zmin=-1, zmax=1
+    def build_corr_chart():
+        corr = df[["avg_temperature", "avg_humidity"]].corr()
+
+        fig_corr = go.Figure(
+            data=go.Heatmap(
+                z=corr.values,
+                x=corr.columns,
+                y=corr.columns,
+                colorscale="RdBu",
+                zmin=-1, zmax=1
+            )
         )
-    )
 
-    fig_corr.update_layout(
-        template="plotly_dark",
-        title="Korelasi Suhu dan Kelembapan",
-        height=350
-    )
+        fig_corr.update_layout(
+            template="plotly_dark",
+            title="Korelasi Suhu dan Kelembapan",
+            height=350
+        )
+        return fig_corr
 
+    fig_corr = get_cached_figure("viz_corr", version, build_corr_chart)
     st.plotly_chart(fig_corr, use_container_width=True)
-
-    fig_line.add_hline(
-        y=rt_temp,
-        line_dash="dash",
-        line_color="white",
-        annotation_text="Realtime Temp",
-        annotation_position="top left"
-    )
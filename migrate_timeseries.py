@@ -0,0 +1,222 @@
+"""
+Migrasi dht22_logs (collection biasa) ke time-series collection dht22_logs_ts.
+
+Pemakaian:
+    python migrate_timeseries.py create            # buat collection time-series
+    python migrate_timeseries.py migrate           # salin data per batch (bisa dilanjutkan)
+    python migrate_timeseries.py migrate --follow  # terus menyalin data baru (sync)
+    python migrate_timeseries.py status            # bandingkan jumlah dokumen
+
+URI MongoDB diambil dari --uri, env MONGO_URI, atau .streamlit/secrets.toml.
+Setelah data tersalin, set `read_mode = "dual"` di [mongo] secrets untuk
+membandingkan hasil baca.
+
+PENTING: ingestion (ESP32) masih menulis ke dht22_logs saja. Sebelum set
+`read_mode = "timeseries"`, pastikan data baru juga masuk ke dht22_logs_ts:
+ubah ingestion agar menulis ke dht22_logs_ts, atau jalankan terus
+`migrate --follow`. Tanpa itu halaman Realtime, Analisis dan Visualisasi
+berhenti di data migrate terakhir.
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+
+import pandas as pd
+from bson import ObjectId
+from pymongo import MongoClient
+
+
+DB_NAME = "iot_db"
+RAW_COLLECTION = "dht22_logs"
+TS_COLLECTION = "dht22_logs_ts"
+MIGRATION_COLLECTION = "migrations"
+MIGRATION_ID = "dht22_logs_to_timeseries"
+DEFAULT_DEVICE = "dht22"
+RESCAN_SECONDS = 60
+
+
+def load_uri(cli_uri):
+    """Cari URI MongoDB: argumen CLI, env, lalu secrets Streamlit"""
+    if cli_uri:
+        return cli_uri
+    if os.environ.get("MONGO_URI"):
+        return os.environ["MONGO_URI"]
+    try:
+        import tomllib
+        with open(os.path.join(".streamlit", "secrets.toml"), "rb") as f:
+            return tomllib.load(f)["mongo"]["uri"]
+    except Exception:
+        sys.exit("URI MongoDB tidak ditemukan. Gunakan --uri atau env MONGO_URI.")
+
+
+def create_timeseries(db):
+    """Membuat time-series collection (timeField created_at, metaField device)"""
+    existing = list(db.list_collections(filter={"name": TS_COLLECTION}))
+    if existing:
+        if "timeseries" not in existing[0].get("options", {}):
+            sys.exit(f"Collection {TS_COLLECTION} sudah ada tapi bukan time-series.")
+        print(f"Collection {TS_COLLECTION} sudah ada.")
+    else:
+        db.create_collection(
+            TS_COLLECTION,
+            timeseries={
+                "timeField": "created_at",
+                "metaField": "device",
+                "granularity": "seconds",
+            },
+        )
+        print(f"Collection {TS_COLLECTION} dibuat.")
+
+    # Dashboard selalu sort created_at terbaru tanpa filter device
+    db[TS_COLLECTION].create_index([("created_at", -1)])
+
+
+def to_timeseries_doc(doc):
+    """
+    Ubah dokumen RAW ke format time-series.
+    created_at wajib bertipe date, jadi string dikonversi dulu.
+    Mengembalikan None kalau created_at tidak valid.
+    """
+    created_at = pd.to_datetime(doc.get("created_at"), errors="coerce", utc=True)
+    if pd.isna(created_at):
+        return None
+    new_doc = dict(doc)
+    new_doc["created_at"] = created_at.to_pydatetime()
+    new_doc.setdefault("device", DEFAULT_DEVICE)
+    return new_doc
+
+
+def migrate(db, batch_size, rescan_seconds=RESCAN_SECONDS):
+    """
+    Menyalin dht22_logs ke dht22_logs_ts per batch, urut _id.
+    Checkpoint memakai _id (ObjectId, satu tipe BSON), bukan created_at yang
+    bisa berupa string, date, atau kosong. Posisi terakhir disimpan di
+    collection migrations setelah setiap batch, jadi script bisa dihentikan
+    dan dijalankan lagi (juga untuk menyusul data baru selama masa cutover).
+
+    ObjectId hanya urut per detik dan bisa masuk terlambat (ditulis klien
+    lain, atau insert yang masih berjalan saat batch dibaca). Karena itu
+    setiap pass membaca ulang rescan_seconds terakhir sebelum checkpoint;
+    dokumen yang sudah tersalin dilewati oleh dedup.
+    """
+    raw_col = db[RAW_COLLECTION]
+    ts_col = db[TS_COLLECTION]
+    state_col = db[MIGRATION_COLLECTION]
+
+    state = state_col.find_one({"_id": MIGRATION_ID}) or {}
+    copied = state.get("copied", 0)
+    skipped = state.get("skipped", 0)
+    # Checkpoint lama (urut created_at) tidak valid untuk urutan _id;
+    # mulai ulang dari awal, dokumen yang sudah ada akan dilewati.
+    last_id = state.get("last_id") if state.get("order") == "_id" else None
+    checkpoint_id = last_id
+
+    if isinstance(last_id, ObjectId):
+        window_start = last_id.generation_time - timedelta(seconds=rescan_seconds)
+        query = {"_id": {"$gte": ObjectId.from_datetime(window_start)}}
+    elif last_id is not None:
+        query = {"_id": {"$gt": last_id}}
+    else:
+        query = {}
+
+    while True:
+        batch = list(raw_col.find(query).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        before = (copied, skipped)
+        docs = []
+        for doc in batch:
+            ts_doc = to_timeseries_doc(doc)
+            if ts_doc is not None:
+                docs.append(ts_doc)
+            elif checkpoint_id is None or doc["_id"] > checkpoint_id:
+                # Jangan hitung ulang dokumen invalid dari jendela rescan
+                skipped += 1
+
+        if docs:
+            # Time-series tidak punya unique index di _id. Kalau batch ini
+            # sempat tersalin sebelum checkpoint (script terhenti), lewati
+            # dokumen yang sudah ada agar tidak dobel.
+            already = {
+                d["_id"] for d in ts_col.find(
+                    {
+                        "created_at": {
+                            "$gte": min(d["created_at"] for d in docs),
+                            "$lte": max(d["created_at"] for d in docs),
+                        },
+                        "_id": {"$in": [d["_id"] for d in docs]},
+                    },
+                    {"_id": 1},
+                )
+            }
+            docs = [d for d in docs if d["_id"] not in already]
+            if docs:
+                ts_col.insert_many(docs, ordered=False)
+                copied += len(docs)
+
+        query = {"_id": {"$gt": batch[-1]["_id"]}}
+        if last_id is None or batch[-1]["_id"] > last_id:
+            last_id = batch[-1]["_id"]
+        state = {
+            "order": "_id",
+            "last_id": last_id,
+            "copied": copied,
+            "skipped": skipped,
+        }
+        state_col.replace_one({"_id": MIGRATION_ID}, state, upsert=True)
+        if (copied, skipped) != before:
+            print(f"Tersalin: {copied} | Dilewati (created_at invalid): {skipped}")
+
+
+def status(db):
+    """Menampilkan jumlah dokumen di kedua collection dan checkpoint migrasi"""
+    raw_count = db[RAW_COLLECTION].estimated_document_count()
+    ts_count = db[TS_COLLECTION].count_documents({})
+    state = db[MIGRATION_COLLECTION].find_one({"_id": MIGRATION_ID}) or {}
+    print(f"{RAW_COLLECTION}: {raw_count} dokumen")
+    print(f"{TS_COLLECTION}: {ts_count} dokumen")
+    print(f"Checkpoint _id: {state.get('last_id', '-')} "
+          f"(tersalin {state.get('copied', 0)}, dilewati {state.get('skipped', 0)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["create", "migrate", "status"])
+    parser.add_argument("--uri", help="MongoDB connection string")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--follow", action="store_true",
+                        help="migrate: terus menyalin data baru sampai dihentikan")
+    parser.add_argument("--interval", type=float, default=3.0,
+                        help="jeda (detik) antar sync untuk --follow")
+    parser.add_argument("--rescan-seconds", type=int, default=RESCAN_SECONDS,
+                        help="baca ulang N detik _id terakhir sebelum checkpoint")
+    args = parser.parse_args()
+
+    db = MongoClient(load_uri(args.uri))[DB_NAME]
+
+    if args.command == "create":
+        create_timeseries(db)
+    elif args.command == "migrate":
+        if TS_COLLECTION not in db.list_collection_names():
+            create_timeseries(db)
+        migrate(db, args.batch_size, args.rescan_seconds)
+        if not args.follow:
+            print("Migrasi selesai.")
+            return
+        print(f"Sync berjalan tiap {args.interval} detik (Ctrl+C untuk berhenti)...")
+        try:
+            while True:
+                time.sleep(args.interval)
+                migrate(db, args.batch_size, args.rescan_seconds)
+        except KeyboardInterrupt:
+            print("Sync dihentikan.")
+    else:
+        status(db)
+
+
+if __name__ == "__main__":
+    main()